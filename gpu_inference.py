@@ -11,6 +11,7 @@ import torch.backends
 
 from neuralcompress.models.bcae_encoder import BCAEEncoder
 from neuralcompress.utils.tpc_dataloader import get_tpc_dataloaders
+from neuralcompress.utils.bn_fusion import fuse_bn_recursively
 
 # when running on wavelet, please use the following data root
 # DATA_ROOT = '/data/datasets/sphenix/highest_framedata_3d/outer'
@@ -155,6 +156,7 @@ def inference():
     encoder.load_state_dict(torch.load(args.checkpoint))
     encoder.to('cuda:0')
     encoder.eval()
+    fuse_bn_recursively(encoder)
 
     # Run inference and save results
     res = vars(args).copy()
@@ -1,8 +1,10 @@
 """
 base model
 """
+import functools
 import torch
 from torch.nn import init
+from torch.nn.parallel import DistributedDataParallel
 
 def winit_func(model, init_gain=.2):
     """
@@ -17,6 +19,35 @@ def winit_func(model, init_gain=.2):
         init.xavier_normal_(model.weight.data, init_gain)
 
 
+def _autocast_call(module, amp_dtype, *args, **kwargs):
+    """
+    Call the module under autocast with the given dtype.
+    """
+    with torch.autocast(device_type='cuda', dtype=amp_dtype):
+        return module(*args, **kwargs)
+
+
+class AutocastDataParallel(torch.nn.DataParallel):
+    """
+    DataParallel that runs the replicas under autocast with amp_dtype.
+    DataParallel only passes the enabled flag of autocast to the
+    threads running the replicas, so they would fall back to the
+    default float16 autocast dtype.
+    The state dict is the same as that of DataParallel.
+    """
+    def __init__(self, module, device_ids=None, amp_dtype=None):
+        super().__init__(module, device_ids)
+        self.amp_dtype = amp_dtype
+
+    def parallel_apply(self, replicas, inputs, kwargs):
+        if self.amp_dtype is not None and torch.is_autocast_enabled():
+            replicas = [
+                functools.partial(_autocast_call, replica, self.amp_dtype)
+                for replica in replicas
+            ]
+        return super().parallel_apply(replicas, inputs, kwargs)
+
+
 class AutoencoderTrainer:
     """
     Base Model
@@ -29,22 +60,45 @@ class AutoencoderTrainer:
         loss,
         optimizer_info,
         scheduler_info,
-        device
+        device,
+        distributed = False,
+        amp_dtype   = None,
+        device_ids  = None
     ):
         """
         Initialization
+        If distributed, the encoder and decoder are wrapped with
+        DistributedDataParallel on the given device, and the
+        default process group must be initialized beforehand.
+        Otherwise, they are wrapped with DataParallel over
+        device_ids (all visible GPUs if None), see AutocastDataParallel.
+        If amp_dtype (e.g. torch.bfloat16) is given, run the
+        pipe under autocast with that dtype.
         """
 
-        self.encoder  = encoder
-        self.decoder  = decoder
-        self.loss     = loss
-        self.is_train = True
-        self.encoder  = torch.nn.DataParallel(self.encoder)
-        self.decoder  = torch.nn.DataParallel(self.decoder)
+        self.encoder   = encoder
+        self.decoder   = decoder
+        self.loss      = loss.to(device)
+        self.is_train  = True
+        self.amp_dtype = amp_dtype
 
         self.device = device
-        self.encoder.to(device)
-        self.decoder.to(device)
+        if distributed:
+            self.encoder = DistributedDataParallel(
+                self.encoder.to(device), device_ids=[device]
+            )
+            self.decoder = DistributedDataParallel(
+                self.decoder.to(device), device_ids=[device]
+            )
+        else:
+            self.encoder = AutocastDataParallel(
+                self.encoder, device_ids, amp_dtype=amp_dtype
+            )
+            self.decoder = AutocastDataParallel(
+                self.decoder, device_ids, amp_dtype=amp_dtype
+            )
+            self.encoder.to(device)
+            self.decoder.to(device)
         winit_func(self.encoder)
         winit_func(self.decoder)
 
@@ -56,6 +110,32 @@ class AutoencoderTrainer:
         self.scheduler = scheduler_fn(self.optimizer, **scheduler_kwargs)
 
 
+    def autocast(self, cache_enabled=True):
+        """
+        Autocast context for the forward pass.
+        Disabled if amp_dtype is None.
+        The weight cast cache must be disabled
+        when capturing a CUDA graph.
+        """
+        return torch.autocast(
+            device_type   = torch.device(self.device).type,
+            dtype         = self.amp_dtype,
+            enabled       = self.amp_dtype is not None,
+            cache_enabled = cache_enabled
+        )
+
+
+    def compile(self, **kwargs):
+        """
+        Compile the encoder and decoder in place with torch.compile.
+        The keyword arguments (e.g. mode, dynamic) are passed to
+        torch.compile. Compiling in place keeps the state dict keys
+        unchanged, so the saved checkpoints stay loadable.
+        """
+        self.encoder.compile(**kwargs)
+        self.decoder.compile(**kwargs)
+
+
     def encode(self, input_x):
         """
         Encode
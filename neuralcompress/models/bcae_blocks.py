@@ -4,9 +4,16 @@ Author:
 """
 import torch
 import torch.nn as nn
+from torch.utils.checkpoint import checkpoint_sequential
 
+from neuralcompress.models.bcae_fused import (
+    get_negative_slope,
+    is_fusable,
+    fused_rezero_add_activ,
+)
 
-def single_block(block_type, block_args, activ, norm):
+
+def single_block(block_type, block_args, activ, norm, channels_last=False):
     """
     A convolution/deconvolution block
     with activation and normalization
@@ -17,9 +24,11 @@ def single_block(block_type, block_args, activ, norm):
             convolution/deconvolution block;
         - activ: activation function;
         - norm: normalization function;
+        - channels_last (bool): if True, store the weights in
+            the channels_last_3d (NDHWC) memory format;
     Output:
         An nn.Sequential object with convolution/deconvolution
-        followed by activation and then by normalization.
+        followed by normalization and then by activation.
     """
     assert block_type in ['conv', 'deconv']
 
@@ -28,10 +37,13 @@ def single_block(block_type, block_args, activ, norm):
     elif block_type == 'deconv':
         layer = nn.ConvTranspose3d(**block_args)
 
-    return nn.Sequential(layer, norm, activ)
+    block = nn.Sequential(layer, norm, activ)
+    if channels_last:
+        block = block.to(memory_format=torch.channels_last_3d)
+    return block
 
 
-def double_block(block_type, block_args, activ, norm):
+def double_block(block_type, block_args, activ, norm, channels_last=False):
     """
     A double convolution/deconvolution block that contains
         - a convolution/deconvolution layer that does,
@@ -46,6 +58,8 @@ def double_block(block_type, block_args, activ, norm):
             convolution/deconvolution block;
         - activ: activation function;
         - norm: normalization function;
+        - channels_last (bool): if True, store the weights in
+            the channels_last_3d (NDHWC) memory format;
     Output:
         An nn.Sequential object with two convolution/deconvolution layers,
         and activation and normalization in middle.
@@ -62,7 +76,62 @@ def double_block(block_type, block_args, activ, norm):
     )
 
     layer_list = list(block_1) + [block_2] + [nn.BatchNorm3d(block_args['out_channels'])]
-    return nn.Sequential(*layer_list)
+    block = nn.Sequential(*layer_list)
+    if channels_last:
+        block = block.to(memory_format=torch.channels_last_3d)
+    return block
+
+
+class LayerStack(nn.Module):
+    """
+    Base of the encoder and decoder: an nn.Sequential of layers
+    in self.layers with optional gradient checkpointing.
+    """
+    def __init__(self, checkpoint_segments=0):
+        """
+        Input:
+            - checkpoint_segments (int): number of gradient
+                checkpointing segments in training. Activations inside
+                a segment are recomputed during backpropagation instead
+                of being stored. 0 to disable.
+                The batch normalizations in recomputed segments update
+                their running statistics a second time, so it is off
+                by default.
+        """
+        super().__init__()
+        self.layers              = nn.Sequential()
+        self.checkpoint_segments = checkpoint_segments
+
+    def forward(self, input_x):
+        """
+        input_x shape: (N, C, D, H, W)
+            - N = batch_size;
+            - C = input_channels;
+            - D, H, W: the three spatial dimensions
+        """
+        if not torch.jit.is_scripting():
+            if (
+                self.checkpoint_segments > 0 and
+                self.training and
+                torch.is_grad_enabled()
+            ):
+                return self._checkpointed_forward(input_x)
+        return self.layers(input_x)
+
+    @torch.jit.unused
+    def _checkpointed_forward(self, input_x):
+        """
+        Forward with gradient checkpointing.
+        The RNG state is not saved since no layer is random,
+        and saving it is not allowed during CUDA graph capture.
+        """
+        return checkpoint_sequential(
+            self.layers,
+            self.checkpoint_segments,
+            input_x,
+            use_reentrant      = False,
+            preserve_rng_state = False
+        )
 
 
 # TPC data compression project-specific blocks
@@ -76,7 +145,8 @@ class TPCResidualBlock(nn.Module):
         main_block,
         side_block,
         activ,
-        rezero = True
+        rezero        = True,
+        channels_last = False
     ):
         """
         Input:
@@ -84,6 +154,9 @@ class TPCResidualBlock(nn.Module):
             - side_block (nn.Module): the network block on the side path
             - activ: activation function;
             - norm: normalization function;
+            - channels_last (bool): if True, convert the input to the
+                channels_last_3d (NDHWC) memory format before the
+                convolutions so that cuDNN can use its NDHWC kernels;
         Output:
         """
         super().__init__()
@@ -98,11 +171,19 @@ class TPCResidualBlock(nn.Module):
         self.side_block = side_block
 
         self.activ = activ
+        self.negative_slope = get_negative_slope(activ)
+
+        self.channels_last = channels_last
 
         if rezero:
             self.rezero_alpha = nn.Parameter(torch.zeros((1, )))
         else:
-            self.rezero_alpha = 1
+            # a constant tensor rather than a python number, so that
+            # both modes dispatch the same ops. It is not saved to the
+            # state dict to keep older checkpoints loadable.
+            self.register_buffer(
+                'rezero_alpha', torch.ones((1, )), persistent=False
+            )
 
     def forward(self, x_input):
         """
@@ -111,30 +192,82 @@ class TPCResidualBlock(nn.Module):
             - C = channels;
             - D, H, W: the three spatial dimensions
         """
+        if self.channels_last:
+            x_input = x_input.contiguous(memory_format=torch.channels_last_3d)
+
         x_side   = self.side_block(x_input)
         x_main   = self.main_block(x_input)
+
+        if not torch.jit.is_scripting():
+            if self._use_fused(x_main, x_side):
+                return self._fused_output(x_main, x_side)
+
         x_output = self.rezero_alpha * x_main + x_side
         return self.activ(x_output)
 
+    @torch.jit.unused
+    def _use_fused(self, x_main, x_side):
+        """
+        Use the fused residual epilogue on CUDA tensors
+        when the activation is a (leaky) ReLU.
+        Under torch.compile, leave the epilogue to the compiler,
+        and keep the plain ops under FX tracing (e.g. quantization).
+        """
+        return (
+            not torch.compiler.is_compiling() and
+            not torch.fx._symbolic_trace.is_fx_tracing() and
+            self.negative_slope is not None and
+            is_fusable(x_main, x_side)
+        )
+
+    @torch.jit.unused
+    def _fused_output(self, x_main, x_side):
+        """
+        activ(rezero_alpha * x_main + x_side) in one kernel.
+        """
+        return fused_rezero_add_activ(
+            x_main, x_side, self.rezero_alpha, self.negative_slope
+        )
+
 
-def encoder_residual_block(conv_args, activ, rezero=True):
+def encoder_residual_block(conv_args, activ, rezero=True, channels_last=False):
     """
     Get an encoder residual block.
+    The same activ is applied to the output of every normalization
+    and of the residual sum. None of these outputs is needed for
+    backpropagation, so an in-place activation
+    (e.g. nn.LeakyReLU(inplace=True)) is safe and saves one
+    activation tensor per use.
     """
     return TPCResidualBlock(
-        main_block = double_block('conv', conv_args, activ, nn.BatchNorm3d(conv_args['out_channels'])),
-        side_block = single_block('conv', conv_args, activ, nn.BatchNorm3d(conv_args['out_channels'])),
-        activ      = activ,
-        rezero     = rezero
+        main_block    = double_block(
+            'conv', conv_args, activ, nn.BatchNorm3d(conv_args['out_channels']),
+            channels_last = channels_last
+        ),
+        side_block    = single_block(
+            'conv', conv_args, activ, nn.BatchNorm3d(conv_args['out_channels']),
+            channels_last = channels_last
+        ),
+        activ         = activ,
+        rezero        = rezero,
+        channels_last = channels_last
     )
 
-def decoder_residual_block(deconv_args, activ, rezero=True):
+def decoder_residual_block(deconv_args, activ, rezero=True, channels_last=False):
     """
     Get an decoder residual block.
+    See encoder_residual_block for the use of an in-place activ.
     """
     return TPCResidualBlock(
-        main_block = double_block('deconv', deconv_args, activ, nn.BatchNorm3d(deconv_args['out_channels'])),
-        side_block = single_block('deconv', deconv_args, activ, nn.BatchNorm3d(deconv_args['out_channels'])),
-        activ      = activ,
-        rezero     = rezero
+        main_block    = double_block(
+            'deconv', deconv_args, activ, nn.BatchNorm3d(deconv_args['out_channels']),
+            channels_last = channels_last
+        ),
+        side_block    = single_block(
+            'deconv', deconv_args, activ, nn.BatchNorm3d(deconv_args['out_channels']),
+            channels_last = channels_last
+        ),
+        activ         = activ,
+        rezero        = rezero,
+        channels_last = channels_last
     )
@@ -3,11 +3,12 @@ User need to define decoder here
 """
 import torch.nn as nn
 from neuralcompress.models.bcae_blocks import (
+    LayerStack,
     single_block,
     decoder_residual_block,
 )
 
-class DecoderOneHead(nn.Module):
+class DecoderOneHead(LayerStack):
     """
     Decoder with a few upsampling layers plus an output layer.
     """
@@ -20,7 +21,9 @@ class DecoderOneHead(nn.Module):
         output_channels,
         output_activ,
         output_norm,
-        rezero=True
+        rezero=True,
+        channels_last=False,
+        checkpoint_segments=0
     ):
         """
         Input:
@@ -40,18 +43,22 @@ class DecoderOneHead(nn.Module):
             - output_channels (int): out_channels in the output layer.
             - output_activ: output activation layer;
             - output_norm: normalization function for the output layer.
+            - channels_last (bool): if True, run the network in the
+                channels_last_3d (NDHWC) memory format.
+            - checkpoint_segments (int): see LayerStack.
         """
-        super().__init__()
+        super().__init__(checkpoint_segments)
 
         # Upsampling layers
-        self.layers, in_ch = nn.Sequential(), input_channels
+        in_ch = input_channels
         for idx, deconv_args in enumerate(deconv_args_list):
             deconv_args['in_channels'] = in_ch
 
             layer = decoder_residual_block(
                 deconv_args,
                 activ,
-                rezero=rezero
+                rezero        = rezero,
+                channels_last = channels_last
             )
 
             self.layers.add_module(f'decoder_block_{idx}', layer)
@@ -65,32 +72,25 @@ class DecoderOneHead(nn.Module):
             'padding'      : 1
         }
         output_layer = single_block(
-            block_type = 'conv',
-            block_args = block_args,
-            activ      = output_activ,
-            norm       = output_norm
+            block_type    = 'conv',
+            block_args    = block_args,
+            activ         = output_activ,
+            norm          = output_norm,
+            channels_last = channels_last
         )
         self.layers.add_module('decoder_output', output_layer)
 
-    def forward(self, input_x):
-        """
-        input_x shape: (N, C, D, H, W)
-            - N = batch_size;
-            - C = input_channels;
-            - D, H, W: the three spatial dimensions
-        """
-        return self.layers(input_x)
-
 
 class BCAEDecoder(nn.Module):
     """
     BCAE decoder with two heads.
     """
 
-    def __init__(self):
+    def __init__(self, checkpoint_segments=0):
         """
         input_channels = code_channels;
         output_channels = image_channels;
+        checkpoint_segments: see LayerStack;
         """
         super().__init__()
 
@@ -125,16 +125,19 @@ class BCAEDecoder(nn.Module):
         }
         output_channels  = 1
         deconv_args_list = (deconv_1, deconv_2, deconv_3, deconv_4)
-        activ            = nn.LeakyReLU(negative_slope=.25)
+        activ            = nn.LeakyReLU(negative_slope=.25, inplace=True)
         input_channels   = 8
         rezero           = True
+        channels_last    = True
 
         # set up the network
         args = {
             'input_channels'   : input_channels,
             'deconv_args_list' : deconv_args_list,
             'activ'            : activ,
-            'output_channels'  : output_channels
+            'output_channels'  : output_channels,
+            'channels_last'    : channels_last,
+            'checkpoint_segments' : checkpoint_segments
         }
         self.decoder_c = DecoderOneHead(
             **args,
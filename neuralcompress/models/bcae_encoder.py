@@ -3,12 +3,13 @@ User need to define encoder here
 """
 import torch.nn as nn
 from neuralcompress.models.bcae_blocks import (
+    LayerStack,
     single_block,
     encoder_residual_block,
 )
 
 
-class BCAEEncoder(nn.Module):
+class BCAEEncoder(LayerStack):
     """
     Encoder with a few downsampling layers plus an output layer.
     """
@@ -16,12 +17,13 @@ class BCAEEncoder(nn.Module):
 
 
     # pylint: disable=too-many-arguments
-    def __init__(self):
+    def __init__(self, checkpoint_segments=0):
         """
         input_channels = image_channels;
         output_channels = code_channels;
+        checkpoint_segments: see LayerStack;
         """
-        super().__init__()
+        super().__init__(checkpoint_segments)
 
         # default settings
         conv_1 = {
@@ -51,19 +53,21 @@ class BCAEEncoder(nn.Module):
 
         input_channels  = 1
         conv_args_list  = (conv_1, conv_2, conv_3, conv_4)
-        activ           = nn.LeakyReLU(negative_slope=.25)
+        activ           = nn.LeakyReLU(negative_slope=.25, inplace=True)
         output_channels = 8
         rezero          = True
+        channels_last   = True
 
         # Downsampling layers
-        self.layers, in_ch = nn.Sequential(), input_channels
+        in_ch = input_channels
         for idx, conv_args in enumerate(conv_args_list):
             conv_args['in_channels'] = in_ch
 
             layer = encoder_residual_block(
                 conv_args,
                 activ,
-                rezero=rezero
+                rezero        = rezero,
+                channels_last = channels_last
             )
 
             self.layers.add_module(f'encoder_block_{idx}', layer)
@@ -77,18 +81,12 @@ class BCAEEncoder(nn.Module):
             'padding'      : 1
         }
         norm = nn.BatchNorm3d(output_channels)
-        output_layer = single_block('conv', block_args, activ, norm)
+        output_layer = single_block(
+            'conv', block_args, activ, norm,
+            channels_last = channels_last
+        )
         self.layers.add_module('encoder_output', output_layer)
 
-    def forward(self, input_x):
-        """
-        input_x shape: (N, C, D, H, W)
-            - N = batch_size;
-            - C = input_channels;
-            - D, H, W: the three spatial dimensions
-        """
-        return self.layers(input_x)
-
 
 if __name__ == "__main__":
     print("This is the main of bcae_encoder.py")
@@ -0,0 +1,131 @@
+"""
+Fused residual epilogue of the TPC residual block:
+    activ(alpha * x_main + x_side)
+computed in a single Triton kernel.
+"""
+import torch
+
+try:
+    import triton
+    import triton.language as tl
+except ImportError:
+    triton = None
+
+
+if triton is not None:
+    @triton.jit
+    def _rezero_add_activ_kernel(
+        main_ptr,
+        side_ptr,
+        alpha_ptr,
+        out_ptr,
+        numel,
+        negative_slope,
+        BLOCK: tl.constexpr
+    ):
+        """
+        out = leaky_relu(alpha * main + side) over a flat view.
+        """
+        offsets = tl.program_id(0) * BLOCK + tl.arange(0, BLOCK)
+        mask    = offsets < numel
+
+        x_main = tl.load(main_ptr + offsets, mask=mask).to(tl.float32)
+        x_side = tl.load(side_ptr + offsets, mask=mask).to(tl.float32)
+        alpha  = tl.load(alpha_ptr).to(tl.float32)
+
+        x_pre  = alpha * x_main + x_side
+        output = tl.where(x_pre > 0, x_pre, x_pre * negative_slope)
+        tl.store(
+            out_ptr + offsets,
+            output.to(out_ptr.dtype.element_ty),
+            mask=mask
+        )
+
+
+def get_negative_slope(activ):
+    """
+    Return the negative slope of a (leaky) ReLU activation,
+    or None if the activation cannot be fused.
+    """
+    if isinstance(activ, torch.nn.ReLU):
+        return 0.
+    if isinstance(activ, torch.nn.LeakyReLU) and activ.negative_slope >= 0:
+        return activ.negative_slope
+    return None
+
+
+def is_fusable(x_main, x_side):
+    """
+    Whether the fused kernel can be used on the inputs.
+    """
+    return (
+        triton is not None and
+        x_main.is_cuda and
+        x_main.shape == x_side.shape and
+        x_main.dtype == x_side.dtype
+    )
+
+
+class RezeroAddActiv(torch.autograd.Function):
+    """
+    Autograd function of the fused residual epilogue.
+    """
+    # pylint: disable=arguments-differ, abstract-method
+    @staticmethod
+    def forward(ctx, x_main, x_side, alpha, negative_slope):
+        # Both inputs must share the same strides so that
+        # a flat view indexes the same elements.
+        if x_main.is_contiguous(memory_format=torch.channels_last_3d):
+            memory_format = torch.channels_last_3d
+        else:
+            memory_format = torch.contiguous_format
+        x_main = x_main.contiguous(memory_format=memory_format)
+        x_side = x_side.contiguous(memory_format=memory_format)
+
+        # Match the type promotion of the eager expression
+        # alpha * x_main + x_side, e.g. a float32 alpha promotes
+        # bfloat16 activations to float32 under autocast.
+        dtype = torch.promote_types(
+            torch.promote_types(alpha.dtype, x_main.dtype), x_side.dtype
+        )
+        output = torch.empty_like(x_main, dtype=dtype)
+
+        numel = output.numel()
+        block = 1024
+        grid  = (triton.cdiv(numel, block), )
+        _rezero_add_activ_kernel[grid](
+            x_main, x_side, alpha, output, numel, negative_slope,
+            BLOCK=block
+        )
+
+        ctx.save_for_backward(x_main, alpha, output)
+        ctx.negative_slope = negative_slope
+        ctx.side_dtype     = x_side.dtype
+        return output
+
+    @staticmethod
+    def backward(ctx, grad_output):
+        x_main, alpha, output = ctx.saved_tensors
+
+        # With a non-negative slope, the sign of the output
+        # is the sign of the pre-activation.
+        grad_pre = torch.where(
+            output > 0, grad_output, grad_output * ctx.negative_slope
+        )
+
+        grad_main = (grad_pre * alpha).to(x_main.dtype)
+        grad_side = grad_pre.to(ctx.side_dtype)
+        grad_alpha = None
+        if ctx.needs_input_grad[2]:
+            grad_alpha = (grad_pre.float() * x_main.float()).sum()
+            grad_alpha = grad_alpha.reshape(alpha.shape).to(alpha.dtype)
+
+        return grad_main, grad_side, grad_alpha, None
+
+
+def fused_rezero_add_activ(x_main, x_side, alpha, negative_slope):
+    """
+    Compute leaky_relu(alpha * x_main + x_side, negative_slope)
+    in one kernel. alpha is a one-element tensor.
+    """
+    return RezeroAddActiv.apply(x_main, x_side, alpha, negative_slope)
@@ -112,7 +112,9 @@ class BCAELoss(nn.Module):
         # Specifically, the coefficient of classification loss
         # will be scaled up to match that of regression loss
         # Fidn the formula in the pipe function below.
-        self.clf_loss_coef = 20000
+        # The coefficient is kept as a tensor so that
+        # updating it does not synchronize with the GPU.
+        self.register_buffer('clf_loss_coef', torch.tensor(20000.))
         self.clf_loss_coef_exp = .5
 
 
@@ -138,11 +140,10 @@ class BCAELoss(nn.Module):
         # update the coefficient for classification loss
         # and get the overall loss
         exp      = self.clf_loss_coef_exp
-        old_coef = self.clf_loss_coef
-        new_coef = (loss_reg / loss_clf).item()
-        ewm_coef = (exp * old_coef + new_coef) / (exp + 1.)
+        new_coef = (loss_reg / loss_clf).detach()
 
-        self.clf_loss_coef = ewm_coef
+        # exponentially weighted average of the old and new coefficient
+        self.clf_loss_coef.mul_(exp).add_(new_coef).div_(exp + 1.)
         loss               = loss_reg + self.clf_loss_coef * loss_clf
         losses['loss']     = loss
 
@@ -3,6 +3,7 @@ BCAE model
 """
 
 import torch
+import torch.distributed as dist
 
 from neuralcompress.models.autoencoder_trainer import AutoencoderTrainer
 from neuralcompress.models.bcae_encoder import BCAEEncoder
@@ -15,22 +16,53 @@ class BCAETrainer(AutoencoderTrainer):
     bcae trainer
     """
 
-    def __init__(self):
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        device      = 'cuda',
+        distributed = False,
+        cuda_graph  = False,
+        amp_dtype   = None,
+        checkpoint_segments = 0
+    ):
+        """
+        Input:
+            - device: the device to train on;
+            - distributed (bool): if True, train with
+                DistributedDataParallel on the given device.
+            - cuda_graph (bool): if True, capture the training step
+                in a CUDA graph and replay it for every batch of the
+                same shape. Runs on the given device only and cannot
+                be combined with distributed training.
+            - amp_dtype: if given (e.g. torch.bfloat16), run the
+                encoder and decoder under autocast with this dtype.
+                bfloat16 has the range of float32, so no grad scaler
+                is needed. Off by default since GPUs before Ampere
+                have no bfloat16 tensor cores.
+            - checkpoint_segments (int): number of gradient
+                checkpointing segments in the encoder and the decoder
+                heads, see LayerStack. 0 (default) to disable.
+        """
+        assert not (cuda_graph and distributed), \
+            'CUDA graph capture does not support distributed training'
 
         # default settings
-        encoder        = BCAEEncoder()
-        decoder        = BCAEDecoder()
+        encoder        = BCAEEncoder(checkpoint_segments)
+        decoder        = BCAEDecoder(checkpoint_segments)
         loss           = BCAELoss()
-        optimizer_info = (torch.optim.AdamW, {'lr' : 1e-3})
+        optimizer_info = (
+            torch.optim.AdamW,
+            {'lr' : 1e-3, 'capturable' : cuda_graph}
+        )
         scheduler_info = (
             torch.optim.lr_scheduler.StepLR,
             {
                 'step_size' : 20,
                 'gamma'     : .95,
-                'verbose'   : True,
+                # report the learning rate once in distributed training
+                'verbose'   : not distributed or dist.get_rank() == 0,
             }
         )
-        device = 'cuda'
 
         super().__init__(
             encoder,
@@ -38,18 +70,44 @@ class BCAETrainer(AutoencoderTrainer):
             loss,
             optimizer_info,
             scheduler_info,
-            device
+            device,
+            distributed = distributed,
+            amp_dtype   = amp_dtype,
+            device_ids  = [device] if cuda_graph else None
         )
 
+        # CUDA graph of the training step
+        self.cuda_graph     = cuda_graph
+        self.warmup_steps   = 3
+        self._warmup_count  = 0
+        self._graph         = None
+        self._static_input  = None
+        self._static_losses = None
+
     def pipe(self, input_x, is_train):
         """
         encode -> decode -> get losses
         -> backpropagate error and step optimizer
         Used for training and validation during training.
         """
+        if is_train and self.cuda_graph:
+            losses = self._graph_step(input_x)
+        else:
+            losses = self._step(input_x, is_train)
+
+        return {key: val.item() for key, val in losses.items()}
+
+    def _step(self, input_x, is_train):
+        """
+        One eager step. Return the losses as tensors.
+        """
         self.is_train = is_train
-        code          = self.encode(input_x)
-        output        = self.decode(code)
+        with self.autocast(cache_enabled=not self.cuda_graph):
+            code      = self.encode(input_x)
+            output    = self.decode(code)
+        # compute the loss in float32, the focal loss
+        # relies on an epsilon that bfloat16 cannot resolve.
+        output        = [out.float() for out in output]
         losses        = self.loss(output, input_x)
         loss          = losses['loss']
 
@@ -59,7 +117,54 @@ class BCAETrainer(AutoencoderTrainer):
             loss.backward()
             self.optimizer.step()
 
-        return {key: val.item() for key, val in losses.items()}
+        return losses
+
+    def _graph_step(self, input_x):
+        """
+        One training step replayed from a CUDA graph.
+        The first few steps run eagerly on a side stream to warm up
+        cuDNN and the optimizer state before the step is captured.
+        Batches of another shape (e.g. a smaller last batch) fall
+        back to the eager step.
+        """
+        if self._graph is None:
+            if self._warmup_count < self.warmup_steps:
+                self._warmup_count += 1
+                stream = torch.cuda.Stream()
+                stream.wait_stream(torch.cuda.current_stream())
+                with torch.cuda.stream(stream):
+                    losses = self._step(input_x, True)
+                torch.cuda.current_stream().wait_stream(stream)
+                return losses
+            self._capture(input_x)
+        elif input_x.shape != self._static_input.shape:
+            return self._step(input_x, True)
+
+        self._static_input.copy_(input_x, non_blocking=True)
+        self._graph.replay()
+        return self._static_losses
+
+    def _capture(self, input_x):
+        """
+        Capture the forward, backward, and optimizer step.
+        Nothing is computed during the capture.
+        """
+        self._static_input = torch.empty_like(input_x)
+        # gradients are allocated from the graph's private pool
+        self.optimizer.zero_grad(set_to_none=True)
+        self._graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(self._graph):
+            self._static_losses = self._step(self._static_input, True)
+
+    def handle_epoch_end(self):
+        """
+        Step the scheduler. The learning rate is baked into the
+        captured optimizer step, so recapture when it changes.
+        """
+        lrs = [group['lr'] for group in self.optimizer.param_groups]
+        super().handle_epoch_end()
+        if lrs != [group['lr'] for group in self.optimizer.param_groups]:
+            self._graph = None
 
 
 if __name__ == '__main__':
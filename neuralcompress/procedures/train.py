@@ -3,6 +3,9 @@ Generic training functions
 """
 from collections import defaultdict
 import tqdm
+import torch
+import torch.distributed as dist
+from torch.utils.data.distributed import DistributedSampler
 from neuralcompress.utils.tpc_dataloader import get_tpc_dataloaders
 
 
@@ -28,6 +31,40 @@ def format_float(num, threshold=6):
     return f'{{{format_string}}}'.format(num=num)
 
 
+def is_main_process():
+    """
+    Whether this is the rank-0 process in distributed training,
+    or the only process otherwise.
+    """
+    return (
+        not dist.is_available() or
+        not dist.is_initialized() or
+        dist.get_rank() == 0
+    )
+
+
+def average_over_processes(losses, device):
+    """
+    Average the epoch losses over the processes in distributed
+    training. Each process averages over a shard of equal size
+    (DistributedSampler pads the shards), so the mean of the
+    per-process averages is the average over all shards.
+    Return the losses unchanged otherwise.
+    """
+    if not dist.is_available() or not dist.is_initialized():
+        return losses
+
+    keys = sorted(losses)
+    vals = torch.tensor(
+        [losses[key] for key in keys],
+        dtype  = torch.float64,
+        device = device
+    )
+    dist.all_reduce(vals)
+    vals /= dist.get_world_size()
+    return dict(zip(keys, vals.tolist()))
+
+
 def run_epoch(
     loader,
     trainer,
@@ -47,14 +84,15 @@ def run_epoch(
     progbar = tqdm.tqdm(
         desc=progbar_desc,
         total=len(loader),
-        dynamic_ncols=True
+        dynamic_ncols=True,
+        disable=not is_main_process()
     )
     device = trainer.device
 
     losses_avg = defaultdict(int)
     for i, batch in enumerate(loader):
 
-        losses = trainer.pipe(batch.to(device), is_train)
+        losses = trainer.pipe(batch.to(device, non_blocking=True), is_train)
         for key, val in losses.items():
             losses_avg[key] = (losses_avg[key] * i + val) / (i + 1)
 
@@ -64,6 +102,12 @@ def run_epoch(
             refresh=False
         )
         progbar.update()
+
+    # show the average over all processes at the end of the epoch
+    losses_avg = average_over_processes(losses_avg, device)
+    progbar.set_postfix(
+        {key: format_float(val) for key, val in losses_avg.items()}
+    )
     progbar.close()
     trainer.handle_epoch_end()
 
@@ -87,15 +131,22 @@ def train(
 
     epoch_zlen = len(str(epochs))
 
+    save = is_main_process()
+
     for epoch in range(1, epochs + 1):
+        # reshuffle the shards of distributed training
+        if isinstance(train_ldr.sampler, DistributedSampler):
+            train_ldr.sampler.set_epoch(epoch)
+
         descr = f'Epoch {epoch}/{epochs} '
         run_epoch(train_ldr, trainer, f'{descr} Train',True)
 
         if epoch % valid_freq == 0:
             run_epoch(valid_ldr, trainer, f'\033[96m{descr} Valid\033[0m', False)
 
-        if epoch % save_freq == 0:
+        if save and epoch % save_freq == 0:
             print(f'Saving model at epoch {epoch}')
             trainer.save(save_path, epoch, epoch_zlen)
 
-    trainer.save(save_path)
+    if save:
+        trainer.save(save_path)
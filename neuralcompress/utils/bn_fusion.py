@@ -0,0 +1,74 @@
+"""
+Fold BatchNorm3d layers into the preceding convolution
+for inference.
+"""
+import torch
+import torch.nn as nn
+
+
+def fuse_conv_bn(conv, norm):
+    """
+    Fold the affine transformation of an eval-mode batch
+    normalization into the weight and bias of the
+    preceding convolution/deconvolution (in place).
+    Input:
+        - conv (nn.Conv3d or nn.ConvTranspose3d): the convolution;
+        - norm (nn.BatchNorm3d): the batch normalization following conv;
+    Output:
+        The convolution with the normalization folded in.
+    Only ungrouped deconvolutions are supported.
+    """
+    # Conv3d weight has shape (out, in/groups, kD, kH, kW) while
+    # ConvTranspose3d weight has shape (in, out/groups, kD, kH, kW),
+    # so the output channels are only on dim 1 when groups == 1.
+    if isinstance(conv, nn.ConvTranspose3d):
+        assert conv.groups == 1, \
+            'cannot fuse batch normalization into a grouped deconvolution'
+        scale_shape = (1, -1, 1, 1, 1)
+    else:
+        scale_shape = (-1, 1, 1, 1, 1)
+
+    with torch.no_grad():
+        scale = torch.rsqrt(norm.running_var + norm.eps)
+        shift = -norm.running_mean * scale
+        if norm.affine:
+            scale = scale * norm.weight
+            shift = shift * norm.weight + norm.bias
+
+        conv.weight.mul_(scale.reshape(scale_shape))
+        if conv.bias is None:
+            conv.bias = nn.Parameter(shift.clone())
+        else:
+            conv.bias.mul_(scale).add_(shift)
+
+    return conv
+
+
+def fuse_bn_recursively(module):
+    """
+    Walk through the module and fold every BatchNorm3d that
+    directly follows a Conv3d/ConvTranspose3d in an nn.Sequential
+    into the convolution. The folded normalization is replaced
+    by nn.Identity.
+    Only use it on a model in eval mode, since the running
+    statistics are no longer updated afterwards.
+    """
+    assert not module.training, \
+        'batch normalization can only be fused in eval mode'
+
+    for child in module.children():
+        fuse_bn_recursively(child)
+
+    if isinstance(module, nn.Sequential):
+        names = list(module._modules.keys())
+        for prev, curr in zip(names[:-1], names[1:]):
+            conv, norm = module._modules[prev], module._modules[curr]
+            if (
+                isinstance(conv, (nn.Conv3d, nn.ConvTranspose3d)) and
+                isinstance(norm, nn.BatchNorm3d) and
+                norm.track_running_stats
+            ):
+                fuse_conv_bn(conv, norm)
+                module._modules[curr] = nn.Identity()
+
+    return module
@@ -0,0 +1,174 @@
+"""
+Post-training static INT8 quantization of the BCAE encoder and decoder
+"""
+
+import argparse
+import copy
+from pathlib import Path
+import torch
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+from neuralcompress.utils.bn_fusion import fuse_bn_recursively
+from neuralcompress.utils.load_bcae_models import (
+    load_bcae_encoder,
+    load_bcae_decoder
+)
+from neuralcompress.utils.tpc_dataloader import get_tpc_test_dataloader
+
+
+def _unshare_modules(module, seen=None):
+    """
+    Replace every module met a second time in the module tree by
+    a deep copy (in place). The BCAE models pass one activation
+    instance to all of their blocks, which FX would otherwise trace
+    as a single module, so that all call sites would share one
+    quantization scale and zero point.
+    """
+    if seen is None:
+        seen = set()
+    for name, child in module.named_children():
+        if id(child) in seen:
+            child = copy.deepcopy(child)
+            setattr(module, name, child)
+        seen.add(id(child))
+        _unshare_modules(child, seen)
+    return module
+
+
+def quantize_bcae(encoder, decoder, loader, num_batches=None, backend='x86'):
+    """
+    Quantize BCAE encoder and decoder to INT8.
+    Input:
+        - encoder, decoder: float models on CPU
+            (unwrapped from DataParallel);
+        - loader: calibration data loader, e.g. the TPC test loader;
+        - num_batches (int): number of batches used for calibration.
+            Use the whole loader if None;
+        - backend (str): quantized engine, 'x86', 'fbgemm', or 'qnnpack';
+    Output:
+        The quantized encoder and decoder. They run on CPU.
+    The batch normalizations are folded into the convolutions first,
+    and every use of a shared module gets its own copy so that it is
+    observed and quantized separately.
+    The decoder is calibrated with the codes of the float encoder.
+    """
+    torch.backends.quantized.engine = backend
+    qconfig_mapping = get_default_qconfig_mapping(backend)
+
+    encoder = _unshare_modules(fuse_bn_recursively(encoder.eval()))
+    decoder = _unshare_modules(fuse_bn_recursively(decoder.eval()))
+
+    example = next(iter(loader))
+    with torch.no_grad():
+        example_code = encoder(example)
+    encoder_prepared = prepare_fx(encoder, qconfig_mapping, (example, ))
+    decoder_prepared = prepare_fx(decoder, qconfig_mapping, (example_code, ))
+
+    # calibration
+    with torch.no_grad():
+        for i, batch in enumerate(loader):
+            if num_batches is not None and i >= num_batches:
+                break
+            encoder_prepared(batch)
+            decoder_prepared(encoder(batch))
+
+    return convert_fx(encoder_prepared), convert_fx(decoder_prepared)
+
+
+def main():
+    """
+    main
+    """
+    parser = argparse.ArgumentParser(
+        description="quantize the BCAE encoder and decoder to INT8"
+    )
+
+    parser.add_argument(
+        '--checkpoint_path',
+        required=True,
+        type=str,
+        help="The path to the checkpoints."
+    )
+
+    parser.add_argument(
+        '--epoch',
+        required=True,
+        type=int,
+        help="The epoch to load."
+    )
+
+    parser.add_argument(
+        '--data_path',
+        required=True,
+        type=str,
+        help="The path to data. Must contain test.txt."
+    )
+
+    parser.add_argument(
+        '--save_path',
+        required=True,
+        type=str,
+        help="The path to save the scripted quantized encoder and decoder."
+    )
+
+    parser.add_argument(
+        '--calib_sz',
+        default=64,
+        required=False,
+        type=int,
+        help="Number of test frames used for calibration | default=64."
+    )
+
+    parser.add_argument(
+        '--batch_size',
+        default=8,
+        required=False,
+        type=int,
+        help="Calibration batch size | default=8."
+    )
+
+    parser.add_argument(
+        '--prefix',
+        default='bcae_int8',
+        required=False,
+        type=str,
+        help="Prefix to the filename of the quantized encoder and decoder."
+    )
+
+    args = parser.parse_args()
+
+    checkpoint_path = Path(args.checkpoint_path)
+    assert checkpoint_path.exists(), f'{checkpoint_path} does not exist!'
+
+    test_manifest = Path(args.data_path)/'test.txt'
+    assert test_manifest.exists(), f'{test_manifest} does not exist!'
+
+    loader = get_tpc_test_dataloader(
+        test_manifest,
+        args.batch_size,
+        test_sz    = args.calib_sz,
+        pin_memory = False
+    )
+
+    encoder = load_bcae_encoder(checkpoint_path, args.epoch).module.cpu()
+    decoder = load_bcae_decoder(checkpoint_path, args.epoch).module.cpu()
+    encoder, decoder = quantize_bcae(encoder, decoder, loader)
+
+    # script and save the quantized model
+    save_path = Path(args.save_path)
+    if not save_path.exists():
+        save_path.mkdir(parents=True)
+
+    prefix = args.prefix
+    quantized_encoder_fname = f'{save_path}/{prefix}_encoder.pt'
+    quantized_decoder_fname = f'{save_path}/{prefix}_decoder.pt'
+    torch.jit.script(encoder).save(quantized_encoder_fname)
+    torch.jit.script(decoder).save(quantized_decoder_fname)
+
+    print(f'quantized BCAE encoder saved to: {quantized_encoder_fname}')
+    print(f'quantized BCAE decoder saved to: {quantized_decoder_fname}')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,11 +2,63 @@
 Get train, valid, and test dataloaders
 """
 #! /usr/bin/env python
+import functools
 from pathlib import Path
 import numpy as np
 from neuralcompress.datasets.tpc_dataset import DatasetTPC3d
 import torch
 from torch.utils.data import (Subset, DataLoader)
+from torch.utils.data.dataloader import default_collate
+from torch.utils.data.distributed import DistributedSampler
+
+@functools.lru_cache(maxsize=4)
+def _load_dataset(manifest):
+    """
+    Cached dataset construction.
+    Input:
+        - manifest (Path): resolved path of the manifest, so that
+            different spellings of the same file share one entry.
+    """
+    return DatasetTPC3d(manifest)
+
+
+def load_tpc_dataset(manifest):
+    """
+    Construct a TPC dataset from a manifest.
+    The dataset reads and verifies every file in the manifest
+    when constructed, so it is cached by manifest path and
+    shared by the loaders built from the same manifest.
+    Files listed in a cached manifest are verified only once,
+    on the first construction.
+    """
+    return _load_dataset(Path(manifest).resolve())
+
+
+def sample_indices(num, sample_sz, rng):
+    """
+    Draw sample_sz distinct indices from range(num) in random order.
+    When sample_sz is small compared to num, use Floyd's algorithm
+    so that only O(sample_sz) memory and time is needed.
+    Otherwise, shuffle the full range.
+    Input:
+        - num (int): number of indices to sample from;
+        - sample_sz (int): number of indices to draw;
+        - rng (np.random.RandomState): random number generator;
+    """
+    if sample_sz * 8 >= num:
+        return rng.permutation(num)[:sample_sz]
+
+    selected = set()
+    for i in range(num - sample_sz, num):
+        j = rng.randint(0, i + 1)
+        selected.add(i if j in selected else j)
+
+    # The set has no meaningful order, and the first few
+    # indices are used as the train split, so shuffle them.
+    indices = np.fromiter(selected, dtype=np.int64, count=sample_sz)
+    rng.shuffle(indices)
+    return indices
+
 
 def subsample_dataset(
     dataset,
@@ -17,17 +69,46 @@ def subsample_dataset(
     """
     subsample a dataset
     """
+    num_examples = len(dataset)
     if sample_sz is None:
-        sample_sz = len(dataset)
-    assert 0 <= sample_sz <= len(dataset), \
-        f'dataset does not contains sample_sz({sample_sz}) many examples'
+        sample_sz = num_examples
+    if not 0 <= sample_sz <= num_examples:
+        raise ValueError(
+            f'dataset does not contains sample_sz({sample_sz}) many examples'
+        )
 
-    indices = np.arange(len(dataset))
     if is_random:
         rng = np.random.RandomState(seed)
-        rng.shuffle(indices)
+        indices = sample_indices(num_examples, sample_sz, rng)
+    else:
+        indices = np.arange(sample_sz)
+
+    return Subset(dataset, indices)
 
-    return Subset(dataset, indices[:sample_sz])
+
+def collate_channels_last(batch):
+    """
+    Collate a batch into an (N, C, D, H, W) tensor stored in the
+    channels_last_3d memory format used by the BCAE model.
+    The conversion runs in the loader workers instead of the
+    training step.
+    """
+    return default_collate(batch).contiguous(
+        memory_format=torch.channels_last_3d
+    )
+
+
+def _worker_kwargs(num_workers, persistent_workers, prefetch_factor):
+    """
+    persistent_workers and prefetch_factor are only
+    accepted by DataLoader with multi-process loading.
+    """
+    if num_workers == 0:
+        return {}
+    return {
+        'persistent_workers' : persistent_workers,
+        'prefetch_factor'    : prefetch_factor
+    }
 
 
 # pylint: disable=too-many-arguments
@@ -38,17 +119,18 @@ def get_tpc_test_dataloader(
     is_random       = True,
     seed            = None,
     # frequently used DataLoader parameters
-    # the default values are set to match those in PyTorch docs.
-    shuffle         = False,
-    num_workers     = 0,
-    pin_memory      = False,
-    prefetch_factor = 2,
+    # the default values are set for loading to GPUs.
+    shuffle            = False,
+    num_workers        = 4,
+    pin_memory         = True,
+    persistent_workers = True,
+    prefetch_factor    = 4,
 ):
     """
     Get TPC test dataloader
     """
     dataset = subsample_dataset(
-        DatasetTPC3d(manifest),
+        load_tpc_dataset(manifest),
         sample_sz = test_sz,
         is_random = is_random,
         seed      = seed
@@ -56,11 +138,12 @@ def get_tpc_test_dataloader(
 
     return DataLoader(
         dataset,
-        batch_size      = batch_size,
-        shuffle         = shuffle,
-        num_workers     = num_workers,
-        pin_memory      = pin_memory,
-        prefetch_factor = prefetch_factor
+        batch_size  = batch_size,
+        shuffle     = shuffle,
+        num_workers = num_workers,
+        pin_memory  = pin_memory,
+        collate_fn  = collate_channels_last,
+        **_worker_kwargs(num_workers, persistent_workers, prefetch_factor)
     )
 
 # pylint: disable=too-many-arguments
@@ -73,11 +156,15 @@ def get_tpc_train_valid_dataloaders(
     is_random       = True,
     seed            = None,
     # frequently used DataLoader parameters
-    # the default values are set to match those in PyTorch docs.
-    shuffle         = False,
-    num_workers     = 0,
-    pin_memory      = False,
-    prefetch_factor = 2
+    # the default values are set for loading to GPUs.
+    shuffle            = False,
+    num_workers        = 4,
+    pin_memory         = True,
+    persistent_workers = True,
+    prefetch_factor    = 4,
+    # If True, each process of the default process group
+    # gets its own shard of the train and valid data.
+    distributed        = False
 ):
     """
     Get TPC train and valid dataloaders
@@ -88,11 +175,17 @@ def get_tpc_train_valid_dataloaders(
         (train_sz is None and valid_sz is None and valid_ratio is not None)
     ), 'give train size and valid size or just valid ratio'
 
-    dataset = DatasetTPC3d(train_manifest)
+    dataset = load_tpc_dataset(train_manifest)
 
     if valid_ratio is not None:
-        train_sz = int(len(dataset) / (1 + valid_ratio))
-        valid_sz = len(dataset) - train_sz
+        num_examples = len(dataset)
+        train_sz = int(num_examples / (1 + valid_ratio))
+        valid_sz = num_examples - train_sz
+
+    # every process must draw the same subsample
+    # before it is sharded.
+    assert not (distributed and is_random and seed is None), \
+        'seed must be given for distributed random subsampling'
 
     dataset = subsample_dataset(
         dataset,
@@ -100,24 +193,42 @@ def get_tpc_train_valid_dataloaders(
         is_random = is_random,
         seed      = seed
     )
-    train_dataset = Subset(dataset, torch.arange(0, train_sz))
-    valid_dataset = Subset(dataset, torch.arange(train_sz, len(dataset)))
+    # split the subsample indices directly instead of
+    # nesting subsets of the subsample.
+    indices       = dataset.indices
+    train_dataset = Subset(dataset.dataset, indices[:train_sz])
+    valid_dataset = Subset(dataset.dataset, indices[train_sz:])
 
+    if distributed:
+        train_sampler = DistributedSampler(train_dataset, shuffle=shuffle)
+        valid_sampler = DistributedSampler(valid_dataset, shuffle=False)
+        # shuffling is done by the samplers
+        shuffle = False
+    else:
+        train_sampler, valid_sampler = None, None
+
+    worker_kwargs = _worker_kwargs(
+        num_workers, persistent_workers, prefetch_factor
+    )
     train_loader = DataLoader(
         train_dataset,
-        batch_size      = batch_size,
-        shuffle         = shuffle,
-        num_workers     = num_workers,
-        pin_memory      = pin_memory,
-        prefetch_factor = prefetch_factor
+        batch_size  = batch_size,
+        shuffle     = shuffle,
+        sampler     = train_sampler,
+        num_workers = num_workers,
+        pin_memory  = pin_memory,
+        collate_fn  = collate_channels_last,
+        **worker_kwargs
     )
     valid_loader = DataLoader(
         valid_dataset,
-        batch_size      =batch_size,
-        shuffle         = shuffle,
-        num_workers     = num_workers,
-        pin_memory      = pin_memory,
-        prefetch_factor = prefetch_factor
+        batch_size  = batch_size,
+        shuffle     = shuffle,
+        sampler     = valid_sampler,
+        num_workers = num_workers,
+        pin_memory  = pin_memory,
+        collate_fn  = collate_channels_last,
+        **worker_kwargs
     )
     return train_loader, valid_loader
 
@@ -133,22 +244,31 @@ def get_tpc_dataloaders(
     is_random       = True,
     seed            = None,
     # frequently used DataLoader parameters
-    # the default values are set to match those in PyTorch docs.
+    # the default values are set for loading to GPUs.
     # If shuffle is set to true,
     # reshuffle the data at every epoch
-    shuffle         = False,
+    shuffle            = False,
     # Number of subprocess to use for data loading.
     # 0 means that the data will be loaded in the main process.
     # Set a positive number to enable multi-process data loading.
-    num_workers     = 0,
+    num_workers        = 4,
     # If True, the data loader will copy tensors into CIDA pinned
     # memory before returning them.
     # This will speed up data transfer to CUDA-enabled GPUs.
-    pin_memory      = False,
+    pin_memory         = True,
+    # If True, the worker processes are kept alive across epochs
+    # instead of being recreated every time the loader is iterated.
+    # Ignored when num_workers is 0.
+    persistent_workers = True,
     #  Number of samples loaded in advance by each worker.
-    # 2 means there will be a total of 2 * num_workers
-    # samples prefetched across all workers. (default: 2)
-    prefetch_factor = 2,
+    # 4 means there will be a total of 4 * num_workers
+    # samples prefetched across all workers.
+    # Ignored when num_workers is 0.
+    prefetch_factor    = 4,
+    # If True, shard the train and valid data across the
+    # processes of the default process group.
+    # The test data is not sharded.
+    distributed        = False,
 ):
     """
     Get TPC train, valid, and test dataloaders
@@ -163,17 +283,18 @@ def get_tpc_dataloaders(
             test_sz         = test_sz,
             is_random       = is_random,
             seed            = seed,
-            shuffle         = shuffle,
-            num_workers     = num_workers,
-            pin_memory      = pin_memory,
-            prefetch_factor = prefetch_factor
+            shuffle            = shuffle,
+            num_workers        = num_workers,
+            pin_memory         = pin_memory,
+            persistent_workers = persistent_workers,
+            prefetch_factor    = prefetch_factor
         )
     else:
         test_loader = None
 
     if train_sz > 0:
         train_manifest = Path(manifest_path)/'train.txt'
-        assert test_manifest.exists(), \
+        assert train_manifest.exists(), \
             f'{train_manifest} does not exist.'
         train_loader, valid_loader = get_tpc_train_valid_dataloaders(
             train_manifest,
@@ -183,10 +304,12 @@ def get_tpc_dataloaders(
             valid_ratio     = valid_ratio,
             is_random       = is_random,
             seed            = seed,
-            shuffle         = shuffle,
-            num_workers     = num_workers,
-            pin_memory      = pin_memory,
-            prefetch_factor = prefetch_factor
+            shuffle            = shuffle,
+            num_workers        = num_workers,
+            pin_memory         = pin_memory,
+            persistent_workers = persistent_workers,
+            prefetch_factor    = prefetch_factor,
+            distributed        = distributed
         )
     else:
         train_loader, valid_loader = None, None
@@ -13,6 +13,7 @@ from neuralcompress.utils.load_bcae_models import (
 )
 
 from neuralcompress.models.bcae_combine import BCAECombine
+from neuralcompress.utils.bn_fusion import fuse_bn_recursively
 
 
 #################################################################
@@ -40,6 +41,8 @@ encoder.to(device)
 decoder.to(device)
 encoder.eval()
 decoder.eval()
+fuse_bn_recursively(encoder)
+fuse_bn_recursively(decoder)
 encoder.half()
 
 def debug(self, input, output):
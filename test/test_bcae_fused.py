@@ -0,0 +1,92 @@
+"""
+Test the fused residual epilogue in `neuralcompress/models/bcae_fused.py`
+against the eager expression activ(alpha * x_main + x_side).
+Needs a CUDA device and triton.
+
+Usage: python -m unittest test.test_bcae_fused
+"""
+import unittest
+import torch
+import torch.nn.functional as F
+
+from neuralcompress.models.bcae_fused import (
+    triton,
+    fused_rezero_add_activ,
+)
+
+
+NEGATIVE_SLOPE = .25
+TOLERANCE = {
+    torch.float32  : {'rtol' : 1e-5, 'atol' : 1e-5},
+    torch.bfloat16 : {'rtol' : 1e-2, 'atol' : 1e-2},
+}
+
+
+def make_inputs(dtype, memory_format):
+    """
+    Random main-path, side-path, and rezero inputs on CUDA.
+    """
+    shape  = (2, 4, 6, 10, 8)
+    x_main = torch.randn(shape, device='cuda').to(dtype)
+    x_side = torch.randn(shape, device='cuda').to(dtype)
+    x_main = x_main.contiguous(memory_format=memory_format)
+    x_side = x_side.contiguous(memory_format=memory_format)
+    alpha  = torch.randn((1, ), device='cuda')
+    return [
+        tensor.detach().requires_grad_()
+        for tensor in (x_main, x_side, alpha)
+    ]
+
+
+@unittest.skipUnless(
+    torch.cuda.is_available() and triton is not None,
+    'needs CUDA and triton'
+)
+class TestFusedRezeroAddActiv(unittest.TestCase):
+    """
+    Compare outputs and gradients of the fused and eager paths.
+    """
+    def test_against_eager(self):
+        """
+        float32 and bfloat16, contiguous and channels_last_3d inputs.
+        """
+        for dtype in (torch.float32, torch.bfloat16):
+            for memory_format in (
+                torch.contiguous_format, torch.channels_last_3d
+            ):
+                with self.subTest(dtype=dtype, memory_format=memory_format):
+                    self._check(dtype, memory_format)
+
+    def _check(self, dtype, memory_format):
+        torch.manual_seed(0)
+        fused_inputs = make_inputs(dtype, memory_format)
+        eager_inputs = [
+            tensor.detach().clone().requires_grad_()
+            for tensor in fused_inputs
+        ]
+
+        fused = fused_rezero_add_activ(*fused_inputs, NEGATIVE_SLOPE)
+        x_main, x_side, alpha = eager_inputs
+        eager = F.leaky_relu(alpha * x_main + x_side, NEGATIVE_SLOPE)
+
+        self.assertEqual(fused.dtype, eager.dtype)
+        torch.testing.assert_close(fused, eager, **TOLERANCE[dtype])
+
+        grad_output = torch.randn_like(eager)
+        fused.backward(grad_output)
+        eager.backward(grad_output)
+
+        for name, fused_input, eager_input in zip(
+            ('x_main', 'x_side', 'alpha'), fused_inputs, eager_inputs
+        ):
+            self.assertEqual(fused_input.grad.dtype, eager_input.grad.dtype)
+            torch.testing.assert_close(
+                fused_input.grad,
+                eager_input.grad,
+                msg=f'gradient of {name} differs',
+                **TOLERANCE[dtype]
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
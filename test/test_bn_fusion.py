@@ -0,0 +1,96 @@
+"""
+Test the batch normalization folding in `neuralcompress/utils/bn_fusion.py`
+on the encoder and decoder residual blocks.
+
+Usage: python -m unittest test.test_bn_fusion
+"""
+import copy
+import unittest
+import torch
+import torch.nn as nn
+
+from neuralcompress.models.bcae_blocks import (
+    encoder_residual_block,
+    decoder_residual_block,
+)
+from neuralcompress.utils.bn_fusion import fuse_bn_recursively
+
+
+def randomize_norms(module):
+    """
+    Give every batch normalization non-trivial running
+    statistics and affine parameters.
+    """
+    with torch.no_grad():
+        for norm in module.modules():
+            if isinstance(norm, nn.BatchNorm3d):
+                norm.running_mean.normal_()
+                norm.running_var.uniform_(.5, 2.)
+                norm.weight.normal_()
+                norm.bias.normal_()
+
+
+class TestFuseBN(unittest.TestCase):
+    """
+    Compare eval-mode residual blocks before and after folding.
+    """
+    def test_encoder_residual_block(self):
+        """
+        Conv3d with and without bias.
+        """
+        for bias in (True, False):
+            with self.subTest(bias=bias):
+                conv_args = {
+                    'in_channels' : 4,
+                    'out_channels': 8,
+                    'kernel_size' : [4, 3, 3],
+                    'padding'     : [1, 0, 1],
+                    'stride'      : [2, 2, 1],
+                    'bias'        : bias
+                }
+                block = encoder_residual_block(
+                    conv_args, nn.LeakyReLU(negative_slope=.25)
+                )
+                self._check(block, (2, 4, 8, 10, 6))
+
+    def test_decoder_residual_block(self):
+        """
+        ConvTranspose3d with and without bias.
+        """
+        for bias in (True, False):
+            with self.subTest(bias=bias):
+                deconv_args = {
+                    'in_channels'   : 8,
+                    'out_channels'  : 4,
+                    'kernel_size'   : [4, 3, 3],
+                    'padding'       : [1, 0, 1],
+                    'stride'        : [2, 2, 1],
+                    'output_padding': 0,
+                    'bias'          : bias
+                }
+                block = decoder_residual_block(
+                    deconv_args, nn.LeakyReLU(negative_slope=.25)
+                )
+                self._check(block, (2, 8, 4, 5, 3))
+
+    def _check(self, block, shape):
+        torch.manual_seed(0)
+        randomize_norms(block)
+        with torch.no_grad():
+            block.rezero_alpha.fill_(.5)
+        block.eval()
+
+        fused = fuse_bn_recursively(copy.deepcopy(block))
+        self.assertFalse(
+            any(isinstance(m, nn.BatchNorm3d) for m in fused.modules())
+        )
+
+        input_x = torch.randn(shape)
+        with torch.no_grad():
+            torch.testing.assert_close(
+                fused(input_x), block(input_x), rtol=1e-4, atol=1e-4
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
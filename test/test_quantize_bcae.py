@@ -0,0 +1,78 @@
+"""
+Test the INT8 quantization in `neuralcompress/utils/quantize_bcae.py`
+against the float BCAE encoder and decoder on CPU.
+
+Usage: python -m unittest test.test_quantize_bcae
+"""
+import copy
+import unittest
+import torch
+
+from neuralcompress.models.bcae_encoder import BCAEEncoder
+from neuralcompress.models.bcae_decoder import BCAEDecoder
+from neuralcompress.utils.quantize_bcae import quantize_bcae
+
+
+BACKEND = 'x86'
+# relative error of the quantized outputs
+TOLERANCE = .15
+
+
+def relative_error(output, reference):
+    """
+    Norm of the error relative to the norm of the reference.
+    """
+    return ((output - reference).norm() / reference.norm()).item()
+
+
+@unittest.skipUnless(
+    BACKEND in torch.backends.quantized.supported_engines,
+    f'needs the {BACKEND} quantized engine'
+)
+class TestQuantizeBCAE(unittest.TestCase):
+    """
+    Compare the INT8 and float models on random frames.
+    """
+    def test_against_float(self):
+        """
+        Random weights, calibrated and tested on random frames.
+        """
+        torch.manual_seed(0)
+        encoder, decoder = BCAEEncoder().eval(), BCAEDecoder().eval()
+        # use the main path of the residual blocks too
+        with torch.no_grad():
+            for name, param in list(encoder.named_parameters()) + \
+                    list(decoder.named_parameters()):
+                if name.endswith('rezero_alpha'):
+                    param.fill_(.5)
+
+        frames = [torch.rand(2, 1, 192, 249, 16) for _ in range(3)]
+        calib_loader, test_frames = frames[:2], frames[2]
+
+        with torch.no_grad():
+            code = encoder(test_frames)
+            clf_output, reg_output = decoder(code)
+
+        encoder_int8, decoder_int8 = quantize_bcae(
+            copy.deepcopy(encoder),
+            copy.deepcopy(decoder),
+            calib_loader,
+            backend = BACKEND
+        )
+
+        with torch.no_grad():
+            code_int8 = encoder_int8(test_frames)
+            clf_output_int8, reg_output_int8 = decoder_int8(code)
+
+        for name, output, reference in (
+            ('code', code_int8, code),
+            ('classification', clf_output_int8, clf_output),
+            ('regression', reg_output_int8, reg_output),
+        ):
+            with self.subTest(output=name):
+                self.assertEqual(output.shape, reference.shape)
+                self.assertLess(relative_error(output, reference), TOLERANCE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,26 +1,54 @@
+"""
+Train BCAE with DistributedDataParallel.
+Usage:
+    torchrun --nproc_per_node=[number of GPUs] test/test_train.py
+"""
+import os
+import torch
+import torch.distributed as dist
 from neuralcompress.procedures.train import train
 from neuralcompress.models.bcae_trainer import BCAETrainer
 
+# TF32 tensor-core math for the float32 parts of training
+torch.backends.cuda.matmul.allow_tf32 = True
+torch.backends.cudnn.allow_tf32       = True
+
+dist.init_process_group('nccl')
+local_rank = int(os.environ['LOCAL_RANK'])
+torch.cuda.set_device(local_rank)
 
 data_path   = '/home/qircai/NeuralCompression/outer'
 data_config = {
-    'batch_size' : 32,
-    'train_sz'   : 960,
-    'valid_sz'   : 320,
-    'test_sz'    : 320,
-    'is_random'  : True,
+    'batch_size'  : 32,
+    'train_sz'    : 960,
+    'valid_sz'    : 320,
+    'test_sz'     : 320,
+    'is_random'   : True,
+    'seed'        : 0,
+    'distributed' : True,
 }
 epochs      = 2000
 valid_freq  = 5
 save_path   = '/home/qircai/NeuralCompression/checkpoints/'
 save_freq   = 20
 
+# The batch size and the frame shape are fixed,
+# so let the compiler specialize on them.
+trainer = BCAETrainer(
+    device      = local_rank,
+    distributed = True,
+    amp_dtype   = torch.bfloat16
+)
+trainer.compile(mode='max-autotune', dynamic=False)
+
 train(
     data_path   = data_path,
     data_config = data_config,
-    trainer     = BCAETrainer(),
+    trainer     = trainer,
     epochs      = epochs,
     valid_freq  = valid_freq,
     save_path   = save_path,
     save_freq   = save_freq
 )
+
+dist.destroy_process_group()
@@ -1,6 +1,11 @@
+import torch
 from neuralcompress.procedures.train import train
 from neuralcompress.models.bcae_trainer import BCAETrainer
 
+# TF32 tensor-core math for the float32 parts of training
+torch.backends.cuda.matmul.allow_tf32 = True
+torch.backends.cudnn.allow_tf32       = True
+
 data_path   = '../outer'
 data_config = {
     'batch_size' : 64,
@@ -17,7 +22,7 @@ save_freq   = 20
 train(
     data_path   = data_path,
     data_config = data_config,
-    trainer     = BCAETrainer(),
+    trainer     = BCAETrainer(amp_dtype=torch.bfloat16),
     epochs      = epochs,
     valid_freq  = valid_freq,
     save_path   = save_path,